@@ -1,13 +1,23 @@
-import json
+import hashlib
 import os
+import stat
+import sys
+import tempfile
 import time
 from copy import deepcopy
-from threading import RLock
+from dataclasses import dataclass
+from itertools import chain
+from threading import Event, Lock, RLock, Thread
 from typing import Optional
 
 import boto3
+import numpy as np
+import orjson
+import shapely
 from botocore.exceptions import ClientError
-from shapely.geometry import MultiPolygon, Polygon
+from shapely.geometry import MultiPolygon
+from shapely.prepared import PreparedGeometry, prep
+from shapely.strtree import STRtree
 
 from lib.models import AreaInput
 from lib.kml_service import maybe_refresh_automatic_area
@@ -19,6 +29,59 @@ MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY")
 MINIO_REGION = os.getenv("MINIO_REGION", "us-east-1")
 CACHE_SYNC_INTERVAL_SECONDS = float(os.getenv("AREAS_CACHE_SYNC_INTERVAL_SECONDS", "2"))
+# os.getuid nao existe no Windows, onde o diretorio temporario ja e do perfil do usuario.
+_getuid = getattr(os, "getuid", None)
+# Cache local (registros + geometrias em WKB) do ultimo areas.json lido, indexado pelo ETag.
+# /tmp e o unico diretorio gravavel no Vercel; o diretorio e privado (0700) do usuario do processo.
+AREAS_DISK_CACHE_DIR = os.getenv(
+    "AREAS_DISK_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), f"score_api-{_getuid()}" if _getuid else "score_api"),
+)
+AREAS_DISK_CACHE_FILE = "areas_cache.json"
+AREAS_DISK_CACHE_FORMAT = "score_api.areas_cache"
+AREAS_DISK_CACHE_VERSION = 1
+# Acima deste tamanho (em graus) o float32 relativo a origem perde a precisao de centimetros.
+FLOAT32_MAX_SPAN_DEGREES = 1.0
+
+
+@dataclass
+class RingArrays:
+    """
+    Segmentos de todos os aneis de uma area em layout SoA, relativos a (origin_x, origin_y).
+
+    xs/ys sao o inicio de cada segmento e next_xs/next_ys o fim; `ring_starts`
+    delimita os segmentos de cada anel e `ring_bboxes` guarda (minx, miny, maxx, maxy)
+    por anel. Areas pequenas usam float32; as demais ficam em float64.
+    """
+
+    xs: np.ndarray
+    ys: np.ndarray
+    next_xs: np.ndarray
+    next_ys: np.ndarray
+    ring_starts: np.ndarray
+    ring_bboxes: np.ndarray
+    origin_x: float
+    origin_y: float
+
+
+def private_cache_dir(create: bool = False) -> Optional[str]:
+    """
+    Diretorio dos caches locais (areas e JIT do numba). So e usado se for um diretorio real
+    (nao symlink), do usuario do processo e sem permissao para grupo/outros: ninguem mais
+    consegue plantar arquivos.
+    Sem uid/permissoes POSIX (Windows), so o tipo do diretorio e conferido.
+    """
+    try:
+        if create:
+            os.makedirs(AREAS_DISK_CACHE_DIR, mode=0o700, exist_ok=True)
+        info = os.lstat(AREAS_DISK_CACHE_DIR)
+    except OSError:
+        return None
+    if not stat.S_ISDIR(info.st_mode):
+        return None
+    if _getuid is not None and (info.st_uid != _getuid() or info.st_mode & 0o077):
+        return None
+    return AREAS_DISK_CACHE_DIR
 
 
 def _color_from_slug(slug: str) -> str:
@@ -69,13 +132,30 @@ class AreasRepository:
     Estrategia:
     - carrega do MinIO uma vez por instancia (cold start);
     - reaproveita cache em memoria entre requests;
+    - geometrias sao montadas so no primeiro uso de cada slug;
     - se cache estiver vazio, tenta recarregar do MinIO.
     """
 
     def __init__(self) -> None:
         self._areas_data: dict[str, dict] = {}
         self._geometries: dict[str, MultiPolygon] = {}
-        self._loaded = False
+        self._prepared: dict[str, PreparedGeometry] = {}
+        self._ring_xy: dict[str, RingArrays] = {}
+        self._bounds: dict[str, Optional[tuple[float, float, float, float]]] = {}
+        # WKB (hex) vindo do cache em disco, decodificado (e removido daqui) no primeiro uso do slug.
+        self._wkb: dict[str, str] = {}
+        # (polygon_count, total_points) por slug; fora do registro para nao ir ao MinIO nem ao GET.
+        self._area_stats: dict[str, tuple[int, int]] = {}
+        self._tree: Optional[STRtree] = None
+        self._tree_slugs: list[str] = []
+        self._agencia_index: Optional[dict[str, list[str]]] = None
+        # Versao dos dados em memoria: incrementada a cada escrita ou recarga do MinIO.
+        self._version = 0
+        self._list_cache: Optional[tuple[int, bytes, str]] = None
+        # Setado uma unica vez, apos a primeira carga. Durante a carga, os requests esperam
+        # no evento (ver `_wait_for_first_load`) em vez de enfileirar no lock.
+        self._loaded_event = Event()
+        self._first_load_lock = Lock()
         self._object_etag: Optional[str] = None
         self._last_sync_check_monotonic = 0.0
         self._lock = RLock()
@@ -110,7 +190,9 @@ class AreasRepository:
         if not body or not body.strip():
             return {}, object_etag
 
-        data = json.loads(body.decode("utf-8-sig"))
+        if body.startswith(b"\xef\xbb\xbf"):
+            body = body[3:]
+        data = orjson.loads(body)
         if not isinstance(data, dict):
             raise ValueError("Conteudo do arquivo de areas no MinIO deve ser um objeto JSON.")
         return data, object_etag
@@ -127,7 +209,7 @@ class AreasRepository:
         return str(response.get("ETag", "")).strip('"') or None
 
     def _upload_raw_areas(self) -> None:
-        payload = json.dumps(self._areas_data, ensure_ascii=False, indent=2).encode("utf-8")
+        payload = orjson.dumps(self._areas_data, option=orjson.OPT_INDENT_2)
         response = self._s3.put_object(
             Bucket=MINIO_BUCKET,
             Key=MINIO_OBJECT_KEY,
@@ -138,9 +220,19 @@ class AreasRepository:
         self._last_sync_check_monotonic = time.monotonic()
 
     @staticmethod
-    def _normalize_area_record(area_dict: dict, slug_hint: Optional[str] = None) -> dict:
-        normalized = deepcopy(area_dict)
+    def _intern_record_strings(record: dict) -> None:
+        # slug/name/agencia se repetem em todo resultado de analyze: um unico objeto por valor.
+        for key in ("slug", "name", "agencia"):
+            value = record.get(key)
+            if isinstance(value, str):
+                record[key] = sys.intern(value)
+
+    @classmethod
+    def _normalize_area_record(cls, area_dict: dict, slug_hint: Optional[str] = None) -> dict:
+        # Copia rasa: os polygons (a parte pesada) sao compartilhados e nunca alterados no lugar.
+        normalized = dict(area_dict)
         normalized["slug"] = str(normalized.get("slug") or slug_hint or "").strip()
+        cls._intern_record_strings(normalized)
         normalized["color"] = str(
             normalized.get("color") or _hsl_to_hex(_color_from_slug(normalized["slug"]))
         ).strip().lower()
@@ -162,20 +254,128 @@ class AreasRepository:
     def _hydrate_from_raw(self, raw: dict, object_etag: Optional[str] = None) -> None:
         self._areas_data = {}
         self._geometries = {}
+        self._prepared = {}
+        self._ring_xy = {}
+        self._bounds = {}
+        self._wkb = {}
+        self._area_stats = {}
         for slug, area_dict in raw.items():
             normalized = self._normalize_area_record(area_dict, slug)
             self._areas_data[normalized["slug"]] = normalized
-            self._geometries[normalized["slug"]] = self._build_geometry(normalized["polygons"])
+        self._invalidate_indexes()
         self._object_etag = object_etag
 
+    @classmethod
+    def _read_disk_cache(cls) -> Optional[dict]:
+        cache_dir = private_cache_dir()
+        if cache_dir is None:
+            return None
+        try:
+            with open(os.path.join(cache_dir, AREAS_DISK_CACHE_FILE), "rb") as cache_file:
+                cache = orjson.loads(cache_file.read())
+        except (OSError, orjson.JSONDecodeError):
+            return None
+
+        # Cache de outro formato/versao, ou incompleto: ignora e volta para o MinIO.
+        if (
+            not isinstance(cache, dict)
+            or cache.get("format") != AREAS_DISK_CACHE_FORMAT
+            or cache.get("version") != AREAS_DISK_CACHE_VERSION
+            or not isinstance(cache.get("etag"), str)
+            or not isinstance(cache.get("areas"), dict)
+            or not isinstance(cache.get("bounds"), dict)
+            or not isinstance(cache.get("wkbs"), dict)
+        ):
+            return None
+        return cache
+
+    @classmethod
+    def _write_disk_cache(cls, object_etag: str, areas_data: dict[str, dict]) -> None:
+        try:
+            # WKB em hex dentro do proprio JSON: nenhum formato executavel e desserializado.
+            wkbs = {
+                slug: shapely.to_wkb(cls._build_geometry(data["polygons"]), hex=True)
+                for slug, data in areas_data.items()
+            }
+            bounds = {slug: cls._bounds_from_raw(data["polygons"]) for slug, data in areas_data.items()}
+            payload = orjson.dumps({
+                "format": AREAS_DISK_CACHE_FORMAT,
+                "version": AREAS_DISK_CACHE_VERSION,
+                "etag": object_etag,
+                "areas": areas_data,
+                "bounds": bounds,
+                "wkbs": wkbs,
+            })
+        except Exception:
+            # O cache e so uma otimizacao: area invalida aqui falha no primeiro uso, como antes.
+            return
+
+        cache_dir = private_cache_dir(create=True)
+        if cache_dir is None:
+            return
+
+        # Grava em arquivo temporario e troca atomicamente: leitores nunca veem um cache pela metade.
+        file_descriptor, temp_path = tempfile.mkstemp(dir=cache_dir, prefix=".areas_cache_")
+        try:
+            with os.fdopen(file_descriptor, "wb") as cache_file:
+                cache_file.write(payload)
+            os.replace(temp_path, os.path.join(cache_dir, AREAS_DISK_CACHE_FILE))
+        except Exception:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+
+    def _schedule_disk_cache_write(self, object_etag: Optional[str]) -> None:
+        if not object_etag:
+            return
+        # Monta as geometrias de todo o catalogo fora do caminho do request. So roda na
+        # primeira carga da instancia, entao nao desfaz o carregamento preguicoso a cada escrita.
+        Thread(
+            target=self._write_disk_cache,
+            args=(object_etag, dict(self._areas_data)),
+            daemon=True,
+        ).start()
+
+    def _hydrate_from_disk_cache(self, cache: dict) -> None:
+        self._areas_data = {}
+        for area_dict in cache["areas"].values():
+            self._intern_record_strings(area_dict)
+            self._areas_data[area_dict["slug"]] = area_dict
+        self._geometries = {}
+        self._prepared = {}
+        self._ring_xy = {}
+        self._bounds = {
+            slug: tuple(bounds) if bounds is not None else None
+            for slug, bounds in cache["bounds"].items()
+        }
+        self._wkb = dict(cache["wkbs"])
+        self._area_stats = {}
+        self._invalidate_indexes()
+        self._object_etag = cache["etag"]
+
+    def _load_from_disk_cache_locked(self) -> bool:
+        cache = self._read_disk_cache()
+        if cache is None:
+            return False
+        # head_object e barato; so usa o cache se o objeto no MinIO ainda for o mesmo.
+        if self._get_remote_object_etag() != cache["etag"]:
+            return False
+        self._hydrate_from_disk_cache(cache)
+        return True
+
     def _reload_from_storage_locked(self) -> None:
-        raw, object_etag = self._download_raw_areas()
-        self._hydrate_from_raw(raw, object_etag)
-        self._loaded = True
+        first_load = not self._loaded_event.is_set()
+        if not first_load or not self._load_from_disk_cache_locked():
+            raw, object_etag = self._download_raw_areas()
+            self._hydrate_from_raw(raw, object_etag)
+            if first_load:
+                self._schedule_disk_cache_write(object_etag)
+        self._loaded_event.set()
         self._last_sync_check_monotonic = time.monotonic()
 
     def _sync_with_remote_if_needed_locked(self, force: bool = False) -> None:
-        if not self._loaded:
+        if not self._loaded_event.is_set():
             self._reload_from_storage_locked()
             return
 
@@ -196,16 +396,41 @@ class AreasRepository:
         force_remote_check: bool = False,
     ) -> None:
         with self._lock:
-            if not self._loaded:
+            if not self._loaded_event.is_set():
                 self._reload_from_storage_locked()
                 return
 
             if check_remote:
                 self._sync_with_remote_if_needed_locked(force=force_remote_check)
 
+    def _wait_for_first_load(self) -> None:
+        """
+        Chamado antes de pegar o lock: uma unica thread faz a primeira carga e as demais
+        esperam no evento. Se a carga falhar, a proxima thread acordada tenta de novo.
+        """
+        while not self._loaded_event.is_set():
+            if self._first_load_lock.acquire(blocking=False):
+                try:
+                    self._ensure_loaded()
+                finally:
+                    self._first_load_lock.release()
+                return
+            self._loaded_event.wait(timeout=1.0)
+
+    def warm_up(self) -> None:
+        """Faz a primeira carga fora de um request (startup da aplicacao)."""
+        self._wait_for_first_load()
+
     @staticmethod
-    def _ring_to_xy(ring: list[list[float]]) -> list[tuple[float, float]]:
-        return [(position[0], position[1]) for position in ring]
+    def _ring_to_xy(ring: list[list[float]]) -> np.ndarray:
+        try:
+            xy = np.asarray(ring, dtype=np.float64)
+        except ValueError:
+            xy = None
+        if xy is None or xy.ndim != 2:
+            # Anel vazio ou com posicoes de tamanhos diferentes (com e sem altitude).
+            xy = np.asarray([(position[0], position[1]) for position in ring], dtype=np.float64).reshape(-1, 2)
+        return xy[:, :2]
 
     @staticmethod
     def _extract_coordinates(poly_data: dict) -> list[list[list[float]]]:
@@ -215,15 +440,92 @@ class AreasRepository:
             return [[[point[1], point[0]] for point in poly_data["points"]]]
         raise ValueError("Polygon invalido: esperado 'coordinates' no padrao GeoJSON.")
 
+    @classmethod
+    def _flatten_coordinates(cls, polygons_raw: list[dict]) -> tuple[np.ndarray, np.ndarray, list[int]]:
+        """
+        Achata as coordenadas de todos os aneis em um unico array (N x 2), junto com o
+        anel de cada coordenada e o polygon de cada anel (o primeiro anel e o externo).
+        """
+        rings_xy: list[np.ndarray] = []
+        ring_polygon_index: list[int] = []
+        for polygon_index, poly_data in enumerate(polygons_raw):
+            for ring in cls._extract_coordinates(poly_data):
+                rings_xy.append(cls._ring_to_xy(ring))
+                ring_polygon_index.append(polygon_index)
+
+        if not rings_xy:
+            return np.empty((0, 2), dtype=np.float64), np.empty(0, dtype=np.intp), ring_polygon_index
+
+        coord_ring_index = np.repeat(np.arange(len(rings_xy)), [len(ring_xy) for ring_xy in rings_xy])
+        return np.concatenate(rings_xy), coord_ring_index, ring_polygon_index
+
     @classmethod
     def _build_geometry(cls, polygons_raw: list[dict]) -> MultiPolygon:
-        polys: list[Polygon] = []
-        for poly_data in polygons_raw:
-            coordinates = cls._extract_coordinates(poly_data)
-            shell = cls._ring_to_xy(coordinates[0])
-            holes = [cls._ring_to_xy(ring) for ring in coordinates[1:]]
-            polys.append(Polygon(shell=shell, holes=holes if holes else None))
-        return MultiPolygon(polys)
+        """
+        Monta a MultiPolygon com os construtores em lote do Shapely: todas as
+        coordenadas vao em um unico array e os indices dizem a qual anel/polygon
+        cada uma pertence.
+        """
+        coords, coord_ring_index, ring_polygon_index = cls._flatten_coordinates(polygons_raw)
+        if not len(coords):
+            return MultiPolygon()
+
+        rings = shapely.linearrings(coords, indices=coord_ring_index)
+        return shapely.multipolygons(shapely.polygons(rings, indices=ring_polygon_index))
+
+    @classmethod
+    def _bounds_from_raw(cls, polygons_raw: list[dict]) -> Optional[tuple[float, float, float, float]]:
+        """Bounding box direto das coordenadas brutas, sem montar a geometria."""
+        coords = cls._flatten_coordinates(polygons_raw)[0]
+        if not len(coords):
+            return None
+        min_x, min_y = coords.min(axis=0)
+        max_x, max_y = coords.max(axis=0)
+        return float(min_x), float(min_y), float(max_x), float(max_y)
+
+    @staticmethod
+    def _build_ring_arrays(geometry: MultiPolygon) -> RingArrays:
+        """
+        Achata todos os aneis da area em arrays SoA prontos para o kernel de distancia.
+        As coordenadas sao gravadas como deslocamento a partir do canto do bbox da area,
+        o que permite usar float32 sem perder precisao em areas pequenas.
+        """
+        starts: list[np.ndarray] = []
+        ends: list[np.ndarray] = []
+        ring_starts = [0]
+        ring_bboxes: list[tuple[float, float, float, float]] = []
+        for polygon in geometry.geoms:
+            for ring in (polygon.exterior, *polygon.interiors):
+                coords = np.asarray(ring.coords, dtype=np.float64)[:, :2]
+                starts.append(coords[:-1])
+                ends.append(coords[1:])
+                ring_starts.append(ring_starts[-1] + len(coords) - 1)
+                ring_bboxes.append(ring.bounds)
+
+        if not starts:
+            empty = np.empty(0, dtype=np.float64)
+            return RingArrays(
+                empty, empty, empty, empty, np.zeros(1, dtype=np.int64), np.empty((0, 4)), 0.0, 0.0
+            )
+
+        min_x, min_y, max_x, max_y = geometry.bounds
+        origin = np.array([min_x, min_y])
+        span = max(max_x - min_x, max_y - min_y)
+        dtype = np.float32 if span <= FLOAT32_MAX_SPAN_DEGREES else np.float64
+
+        segment_starts = (np.concatenate(starts) - origin).astype(dtype)
+        segment_ends = (np.concatenate(ends) - origin).astype(dtype)
+        bboxes = (np.asarray(ring_bboxes, dtype=np.float64) - np.tile(origin, 2)).astype(dtype)
+        return RingArrays(
+            xs=np.ascontiguousarray(segment_starts[:, 0]),
+            ys=np.ascontiguousarray(segment_starts[:, 1]),
+            next_xs=np.ascontiguousarray(segment_ends[:, 0]),
+            next_ys=np.ascontiguousarray(segment_ends[:, 1]),
+            ring_starts=np.asarray(ring_starts, dtype=np.int64),
+            ring_bboxes=bboxes,
+            origin_x=float(min_x),
+            origin_y=float(min_y),
+        )
 
     @staticmethod
     def _count_polygon_points(poly_data: dict) -> int:
@@ -233,11 +535,108 @@ class AreasRepository:
             return len(poly_data["points"])
         return 0
 
-    def _apply_area_record(self, area_dict: dict) -> None:
+    def _apply_area_record(self, area_dict: dict, reuse_geometry_of: Optional[str] = None) -> None:
+        """
+        Grava o registro normalizado. Com `reuse_geometry_of` (polygons inalterados), os
+        caches de geometria daquele slug sao mantidos/movidos em vez de descartados.
+        """
         normalized = self._normalize_area_record(area_dict, area_dict.get("slug"))
         slug = normalized["slug"]
         self._areas_data[slug] = normalized
-        self._geometries[slug] = self._build_geometry(normalized["polygons"])
+        if reuse_geometry_of is None:
+            self._discard_geometry(slug)
+        elif reuse_geometry_of != slug:
+            self._move_geometry(reuse_geometry_of, slug)
+        # Mesmo slug e mesma geometria: os bounding boxes do STRtree continuam valendo.
+        self._invalidate_indexes(keep_tree=reuse_geometry_of == slug)
+
+    def _geometry_caches(self) -> tuple[dict, ...]:
+        return (
+            self._geometries,
+            self._prepared,
+            self._ring_xy,
+            self._bounds,
+            self._wkb,
+            self._area_stats,
+        )
+
+    def _discard_geometry(self, slug: str) -> None:
+        for cache in self._geometry_caches():
+            cache.pop(slug, None)
+
+    def _move_geometry(self, old_slug: str, new_slug: str) -> None:
+        for cache in self._geometry_caches():
+            cache.pop(new_slug, None)
+            if old_slug in cache:
+                cache[new_slug] = cache.pop(old_slug)
+
+    def _get_geometry_locked(self, slug: str) -> Optional[MultiPolygon]:
+        geometry = self._geometries.get(slug)
+        if geometry is None:
+            data = self._areas_data.get(slug)
+            if data is None:
+                return None
+            wkb = self._wkb.pop(slug, None)
+            geometry = shapely.from_wkb(wkb) if wkb is not None else self._build_geometry(data["polygons"])
+            self._geometries[slug] = geometry
+            self._prepared[slug] = prep(geometry)
+        return geometry
+
+    def _get_area_stats_locked(self, slug: str) -> tuple[int, int]:
+        stats = self._area_stats.get(slug)
+        if stats is None:
+            polygons = self._areas_data[slug]["polygons"]
+            stats = (len(polygons), sum(self._count_polygon_points(polygon) for polygon in polygons))
+            self._area_stats[slug] = stats
+        return stats
+
+    def _get_ring_arrays_locked(self, slug: str) -> Optional[RingArrays]:
+        ring_xy = self._ring_xy.get(slug)
+        if ring_xy is None:
+            geometry = self._get_geometry_locked(slug)
+            if geometry is None:
+                return None
+            ring_xy = self._build_ring_arrays(geometry)
+            self._ring_xy[slug] = ring_xy
+        return ring_xy
+
+    def _get_bounds_locked(self, slug: str) -> Optional[tuple[float, float, float, float]]:
+        if slug not in self._bounds:
+            self._bounds[slug] = self._bounds_from_raw(self._areas_data[slug]["polygons"])
+        return self._bounds[slug]
+
+    def _invalidate_indexes(self, keep_tree: bool = False) -> None:
+        if not keep_tree:
+            self._tree = None
+            self._tree_slugs = []
+        self._agencia_index = None
+        self._version += 1
+
+    def _get_tree_locked(self) -> STRtree:
+        if self._tree is None:
+            # STRtree e imutavel: reconstruido sob demanda apos qualquer escrita. Usa so os
+            # bounding boxes, entao nenhuma geometria precisa ser montada para o filtro.
+            bounds_by_slug = {slug: self._get_bounds_locked(slug) for slug in self._areas_data}
+            self._tree_slugs = [slug for slug, bounds in bounds_by_slug.items() if bounds is not None]
+            boxes = np.asarray([bounds_by_slug[slug] for slug in self._tree_slugs], dtype=np.float64)
+            self._tree = STRtree(shapely.box(*boxes.reshape(-1, 4).T))
+        return self._tree
+
+    def _get_agencia_index_locked(self) -> dict[str, list[str]]:
+        if self._agencia_index is None:
+            index: dict[str, list[str]] = {}
+            for slug, data in self._areas_data.items():
+                key = str(data.get("agencia", "")).strip().casefold()
+                index.setdefault(key, []).append(slug)
+            self._agencia_index = index
+        return self._agencia_index
+
+    def _find_slugs_by_agencias_locked(self, agencias: list[str]) -> list[str]:
+        index = self._get_agencia_index_locked()
+        slugs: list[str] = []
+        for key in dict.fromkeys(agencia.strip().casefold() for agencia in agencias):
+            slugs.extend(index.get(key, ()))
+        return slugs
 
     def _refresh_area_locked(self, slug: str, force: bool = False) -> Optional[dict]:
         current = self._areas_data.get(slug)
@@ -246,40 +645,65 @@ class AreasRepository:
 
         refreshed = maybe_refresh_automatic_area(current, force=force)
         if refreshed != current:
-            self._apply_area_record(refreshed)
+            # Refresh que falhou ou trouxe os mesmos polygons so muda metadados de `automatic_source`.
+            polygons_changed = refreshed.get("polygons") != current.get("polygons")
+            self._apply_area_record(refreshed, reuse_geometry_of=None if polygons_changed else slug)
             self._upload_raw_areas()
 
         return self._areas_data.get(slug)
 
     def refresh_area(self, slug: str, force: bool = False) -> Optional[dict]:
+        self._wait_for_first_load()
         with self._lock:
             self._ensure_loaded(check_remote=True)
             return self._refresh_area_locked(slug, force=force)
 
+    def _refresh_automatic_areas_locked(self) -> None:
+        changed = False
+        automatic_slugs = [
+            slug for slug, data in self._areas_data.items() if data.get("mode") == "automatic"
+        ]
+        for slug in automatic_slugs:
+            current = self._areas_data.get(slug)
+            refreshed = maybe_refresh_automatic_area(current or {})
+            if refreshed != current:
+                polygons_changed = current is None or refreshed.get("polygons") != current.get("polygons")
+                self._apply_area_record(refreshed, reuse_geometry_of=None if polygons_changed else slug)
+                changed = True
+        if changed:
+            self._upload_raw_areas()
+
     def refresh_all_automatic_areas(self) -> None:
+        self._wait_for_first_load()
         with self._lock:
             self._ensure_loaded(check_remote=True)
-            changed = False
-            automatic_slugs = [
-                slug for slug, data in self._areas_data.items() if data.get("mode") == "automatic"
-            ]
-            for slug in automatic_slugs:
-                current = self._areas_data.get(slug)
-                refreshed = maybe_refresh_automatic_area(current or {})
-                if refreshed != current:
-                    self._apply_area_record(refreshed)
-                    changed = True
-            if changed:
-                self._upload_raw_areas()
+            self._refresh_automatic_areas_locked()
 
     def upsert(self, area: AreaInput) -> None:
+        self._wait_for_first_load()
         with self._lock:
             self._ensure_loaded(check_remote=True, force_remote_check=True)
-            area_dict = self._normalize_area_record(area.model_dump(), area.slug)
+            # Monta o registro direto dos campos validados, sem o model_dump() que copia todos os pontos.
+            area_dict = {
+                "name": area.name,
+                "slug": area.slug,
+                "agencia": area.agencia,
+                "relevancia": area.relevancia,
+                "color": area.color,
+                "polygons": [
+                    {"type": polygon.type, "coordinates": polygon.coordinates}
+                    for polygon in area.polygons
+                ],
+                "mode": area.mode,
+                "automatic_source": (
+                    area.automatic_source.model_dump() if area.automatic_source is not None else None
+                ),
+            }
             self._apply_area_record(area_dict)
             self._upload_raw_areas()
 
     def patch(self, slug: str, changes: dict) -> Optional[dict]:
+        self._wait_for_first_load()
         with self._lock:
             self._ensure_loaded(check_remote=True, force_remote_check=True)
             current = self._areas_data.get(slug)
@@ -287,97 +711,160 @@ class AreasRepository:
                 return None
 
             new_slug = changes.get("slug", slug)
-            updated = {
-                "name": changes.get("name", current["name"]),
-                "slug": new_slug,
-                "agencia": changes.get("agencia", current.get("agencia", "")),
-                "relevancia": changes.get("relevancia", current.get("relevancia", 1)),
-                "color": changes.get("color", current.get("color")),
-                "polygons": changes.get("polygons", current["polygons"]),
-                "mode": changes.get("mode", current.get("mode", "manual")),
-                "automatic_source": changes.get("automatic_source", current.get("automatic_source")),
-            }
+            updated = dict(current)
+            updated.update(changes)
 
-            self._apply_area_record(updated)
+            # Patch so de metadados: geometria, arrays e bbox continuam valendo.
+            polygons_changed = "polygons" in changes
+            self._apply_area_record(updated, reuse_geometry_of=None if polygons_changed else slug)
 
             if new_slug != slug:
                 del self._areas_data[slug]
-                del self._geometries[slug]
+                self._discard_geometry(slug)
+                self._invalidate_indexes()
 
             self._upload_raw_areas()
             return self._areas_data.get(new_slug)
 
     def delete(self, slug: str) -> bool:
+        self._wait_for_first_load()
         with self._lock:
             self._ensure_loaded(check_remote=True, force_remote_check=True)
             if slug not in self._areas_data:
                 return False
             del self._areas_data[slug]
-            del self._geometries[slug]
+            self._discard_geometry(slug)
+            self._invalidate_indexes()
             self._upload_raw_areas()
             return True
 
-    def get_geometry(self, slug: str) -> Optional[MultiPolygon]:
+    def get_analysis_inputs(
+        self,
+        slugs: list[str],
+        agencias: list[str],
+        xs: np.ndarray,
+        ys: np.ndarray,
+        with_ring_arrays: bool = True,
+    ) -> tuple[list[tuple[str, PreparedGeometry, Optional[RingArrays], dict]], list[str], dict[str, np.ndarray]]:
+        """
+        Resolve sob um unico lock (uma checagem de sync) tudo o que o analyze precisa: os slugs
+        pedidos mais os das agencias, a geometria preparada, os arrays de borda e o registro de
+        cada um, e os candidatos do STRtree para os pontos (xs[i], ys[i]). Um patch ou recarga no
+        meio do caminho nao mistura geometria antiga com bounding boxes novos.
+        Devolve tambem os slugs desconhecidos, na ordem pedida.
+        """
+        self._wait_for_first_load()
         with self._lock:
             self._ensure_loaded(check_remote=True)
-            self._refresh_area_locked(slug)
-            return self._geometries.get(slug)
+
+            # Remove duplicados mantendo a ordem de chegada, em uma unica passada.
+            requested: list[str] = []
+            seen: set[str] = set()
+            for slug in chain(slugs, self._find_slugs_by_agencias_locked(agencias) if agencias else ()):
+                if slug not in seen:
+                    seen.add(slug)
+                    requested.append(slug)
+
+            unknown = [slug for slug in requested if slug not in self._areas_data]
+            inputs = []
+            for slug in requested:
+                if slug not in self._areas_data:
+                    continue
+                area_data = self._refresh_area_locked(slug)
+                self._get_geometry_locked(slug)
+                inputs.append((
+                    slug,
+                    self._prepared[slug],
+                    self._get_ring_arrays_locked(slug) if with_ring_arrays else None,
+                    area_data,
+                ))
+
+            # Depois dos refreshes acima: o STRtree ja reflete as geometrias devolvidas.
+            candidates = self._query_candidates_locked(xs, ys) if inputs else {}
+            return inputs, unknown, candidates
+
+    def _query_candidates_locked(self, xs: np.ndarray, ys: np.ndarray) -> dict[str, np.ndarray]:
+        """Para cada slug, os indices dos pontos (xs[i], ys[i]) dentro do seu bounding box."""
+        tree = self._get_tree_locked()
+        point_index, tree_index = tree.query(shapely.points(xs, ys))
+        order = np.argsort(tree_index, kind="stable")
+        tree_index = tree_index[order]
+        point_index = point_index[order]
+        unique_index, first = np.unique(tree_index, return_index=True)
+        return {
+            self._tree_slugs[index]: indices
+            for index, indices in zip(unique_index, np.split(point_index, first[1:]))
+        }
 
     def get_raw(self, slug: str) -> Optional[dict]:
+        self._wait_for_first_load()
         with self._lock:
             self._ensure_loaded(check_remote=True)
             return self._refresh_area_locked(slug)
 
-    def find_slugs_by_agencias(self, agencias: list[str]) -> list[str]:
-        with self._lock:
-            self._ensure_loaded(check_remote=True)
-            normalized = {agencia.strip().casefold() for agencia in agencias}
-            return [
-                slug
-                for slug, data in self._areas_data.items()
-                if str(data.get("agencia", "")).strip().casefold() in normalized
-            ]
-
-    def list_all(self) -> list[dict]:
+    def _build_summaries_locked(self) -> list[dict]:
+        summaries = []
+        for slug, data in self._areas_data.items():
+            polygon_count, total_points = self._get_area_stats_locked(slug)
+            summaries.append({
+                "name": data["name"],
+                "slug": slug,
+                "agencia": data.get("agencia", ""),
+                "relevancia": data.get("relevancia", 1),
+                "color": data.get("color") or _hsl_to_hex(_color_from_slug(slug)),
+                "polygon_count": polygon_count,
+                "total_points": total_points,
+                "mode": data.get("mode", "manual"),
+                "automatic_source_type": (data.get("automatic_source") or {}).get("type"),
+                "last_refreshed_at": (data.get("automatic_source") or {}).get("last_refreshed_at"),
+                "last_refresh_attempt_at": (data.get("automatic_source") or {}).get("last_refresh_attempt_at"),
+                "last_refresh_error": (data.get("automatic_source") or {}).get("last_refresh_error"),
+            })
+        return summaries
+
+    def list_all_payload(self) -> tuple[bytes, str]:
+        """
+        Lista de areas ja serializada em JSON e seu ETag. O resultado fica memoizado
+        ate a proxima escrita ou recarga, entao requisicoes repetidas nao remontam nada.
+        """
+        self._wait_for_first_load()
         with self._lock:
             self._ensure_loaded(check_remote=True)
-            automatic_slugs = [
-                slug for slug, data in self._areas_data.items() if data.get("mode") == "automatic"
-            ]
-            changed = False
-            for slug in automatic_slugs:
-                current = self._areas_data.get(slug)
-                refreshed = maybe_refresh_automatic_area(current or {})
-                if refreshed != current:
-                    self._apply_area_record(refreshed)
-                    changed = True
-            if changed:
-                self._upload_raw_areas()
-
-            return [
-                {
-                    "name": data["name"],
-                    "slug": slug,
-                    "agencia": data.get("agencia", ""),
-                    "relevancia": data.get("relevancia", 1),
-                    "color": data.get("color") or _hsl_to_hex(_color_from_slug(slug)),
-                    "polygon_count": len(data["polygons"]),
-                    "total_points": sum(
-                        self._count_polygon_points(polygon) for polygon in data["polygons"]
-                    ),
-                    "mode": data.get("mode", "manual"),
-                    "automatic_source_type": (data.get("automatic_source") or {}).get("type"),
-                    "last_refreshed_at": (data.get("automatic_source") or {}).get("last_refreshed_at"),
-                    "last_refresh_attempt_at": (data.get("automatic_source") or {}).get("last_refresh_attempt_at"),
-                    "last_refresh_error": (data.get("automatic_source") or {}).get("last_refresh_error"),
-                }
-                for slug, data in self._areas_data.items()
-            ]
+            self._refresh_automatic_areas_locked()
+            if self._list_cache is None or self._list_cache[0] != self._version:
+                payload = orjson.dumps(self._build_summaries_locked())
+                etag = f'"{hashlib.md5(payload).hexdigest()}"'
+                self._list_cache = (self._version, payload, etag)
+            return self._list_cache[1], self._list_cache[2]
 
     def exists(self, slug: str) -> bool:
+        self._wait_for_first_load()
         with self._lock:
             self._ensure_loaded(check_remote=True)
             return slug in self._areas_data
 
 
-repository = AreasRepository()
+_repository_instance: Optional[AreasRepository] = None
+_repository_init_lock = Lock()
+
+
+def _get_repo() -> AreasRepository:
+    global _repository_instance
+    if _repository_instance is None:
+        with _repository_init_lock:
+            if _repository_instance is None:
+                _repository_instance = AreasRepository()
+    return _repository_instance
+
+
+class _LazyRepo:
+    """
+    Proxy do repositorio: o cliente S3 so e criado no primeiro uso, nao no import.
+    Assim o cold start (e o /health) nao paga a inicializacao do boto3.
+    """
+
+    def __getattr__(self, name: str):
+        return getattr(_get_repo(), name)
+
+
+repository = _LazyRepo()
@@ -0,0 +1,167 @@
+"""
+Kernels de distancia ate a borda. Importado sob demanda pelo `lib.geo_service`
+(ver `_get_kernels`), que define o NUMBA_CACHE_DIR antes do import.
+
+O numba e opcional (com o llvmlite, passa do limite de tamanho da funcao na Vercel):
+sem ele, as mesmas funcoes rodam em Python/NumPy. As constantes ficam neste arquivo
+porque o cache do numba e invalidado pela data dele.
+"""
+
+import math
+import os
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Sem NUMBA_CACHE_DIR (diretorio privado indisponivel) os kernels compilam sem cache em disco:
+# o padrao do numba grava ao lado do pacote, somente-leitura na Vercel.
+JIT_CACHE = bool(os.getenv("NUMBA_CACHE_DIR"))
+
+EARTH_RADIUS_M = 6_371_000
+# Ate 10 km o erro da aproximacao equiretangular fica abaixo de 4 mm (medido contra Haversine);
+# acima disso cresce com o quadrado da distancia (~0,5 m em 50 km) e passa a valer Haversine.
+EQUIRECTANGULAR_MAX_DISTANCE_M = 10_000.0
+
+
+def _jit(**options):
+    """`njit` quando o numba esta instalado; sem ele, a funcao fica em Python."""
+    if njit is None:
+        return lambda function: function
+    return njit(cache=JIT_CACHE, **options)
+
+
+@_jit(fastmath=True)
+def haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Distancia Haversine entre dois pontos em metros."""
+    lat1 = math.radians(lat1)
+    lng1 = math.radians(lng1)
+    lat2 = math.radians(lat2)
+    lng2 = math.radians(lng2)
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+@_jit(fastmath=True)
+def distance_meters(lat1: float, lng1: float, lat2: float, lng2: float, high_precision: bool) -> float:
+    """
+    Distancia em metros por projecao equiretangular local (cosseno da latitude media),
+    que ate `EQUIRECTANGULAR_MAX_DISTANCE_M` bate com Haversine no centimetro.
+    Distancias maiores ou `high_precision` usam Haversine.
+    """
+    if high_precision:
+        return haversine(lat1, lng1, lat2, lng2)
+    dlat = math.radians(lat2 - lat1)
+    dlng = math.radians(lng2 - lng1) * math.cos(math.radians(0.5 * (lat1 + lat2)))
+    distance = EARTH_RADIUS_M * math.sqrt(dlat * dlat + dlng * dlng)
+    if distance > EQUIRECTANGULAR_MAX_DISTANCE_M:
+        return haversine(lat1, lng1, lat2, lng2)
+    return distance
+
+
+@_jit(fastmath=True, boundscheck=False)
+def _nearest_on_ring_loop(
+    px: float,
+    py: float,
+    xs: np.ndarray,
+    ys: np.ndarray,
+    nxs: np.ndarray,
+    nys: np.ndarray,
+    ring_starts: np.ndarray,
+    ring_bboxes: np.ndarray,
+) -> tuple[float, float]:
+    """
+    Projeta o ponto em cada segmento e devolve o (x, y) mais proximo.
+    Aneis cujo bbox ja esta mais longe que o melhor candidato sao pulados (branch-and-bound).
+    """
+    best_d2 = 1e300
+    best_cx = 0.0
+    best_cy = 0.0
+    for ring in range(ring_starts.shape[0] - 1):
+        bbox_dx = max(float(ring_bboxes[ring, 0]) - px, 0.0, px - float(ring_bboxes[ring, 2]))
+        bbox_dy = max(float(ring_bboxes[ring, 1]) - py, 0.0, py - float(ring_bboxes[ring, 3]))
+        if bbox_dx * bbox_dx + bbox_dy * bbox_dy >= best_d2:
+            continue
+
+        for i in range(ring_starts[ring], ring_starts[ring + 1]):
+            # Leitura no dtype dos arrays (float32 em areas pequenas), conta em float64.
+            x0 = float(xs[i])
+            y0 = float(ys[i])
+            dx = float(nxs[i]) - x0
+            dy = float(nys[i]) - y0
+            den = dx * dx + dy * dy
+            t = 0.0 if den == 0 else ((px - x0) * dx + (py - y0) * dy) / den
+            if t < 0.0:
+                t = 0.0
+            elif t > 1.0:
+                t = 1.0
+            cx = x0 + t * dx
+            cy = y0 + t * dy
+            d2 = (cx - px) * (cx - px) + (cy - py) * (cy - py)
+            if d2 < best_d2:
+                best_d2 = d2
+                best_cx = cx
+                best_cy = cy
+    return best_cx, best_cy
+
+
+def _nearest_on_ring_numpy(
+    px: float,
+    py: float,
+    xs: np.ndarray,
+    ys: np.ndarray,
+    nxs: np.ndarray,
+    nys: np.ndarray,
+    ring_starts: np.ndarray,
+    ring_bboxes: np.ndarray,
+) -> tuple[float, float]:
+    """
+    Sem numba: projeta o ponto em todos os segmentos de uma vez (sem poda por anel)
+    e devolve o (x, y) mais proximo.
+    """
+    xs = xs.astype(np.float64, copy=False)
+    ys = ys.astype(np.float64, copy=False)
+    dx = nxs.astype(np.float64, copy=False) - xs
+    dy = nys.astype(np.float64, copy=False) - ys
+    den = dx * dx + dy * dy
+    t = np.divide((px - xs) * dx + (py - ys) * dy, den, out=np.zeros_like(den), where=den > 0)
+    np.clip(t, 0.0, 1.0, out=t)
+    cx = xs + t * dx
+    cy = ys + t * dy
+    i = int(np.argmin((cx - px) ** 2 + (cy - py) ** 2))
+    return float(cx[i]), float(cy[i])
+
+
+# O laco com poda so compensa compilado; em Python puro a versao vetorizada e mais rapida.
+nearest_on_ring = _nearest_on_ring_numpy if njit is None else _nearest_on_ring_loop
+
+
+@_jit(fastmath=True, boundscheck=False)
+def border_distances_batch(
+    lats: np.ndarray,
+    lngs: np.ndarray,
+    origin_x: float,
+    origin_y: float,
+    xs: np.ndarray,
+    ys: np.ndarray,
+    nxs: np.ndarray,
+    nys: np.ndarray,
+    ring_starts: np.ndarray,
+    ring_bboxes: np.ndarray,
+    high_precision: bool,
+) -> np.ndarray:
+    """Distancia em metros ate a borda de uma area para varios pontos de uma vez."""
+    distances = np.empty(lats.shape[0])
+    for k in range(lats.shape[0]):
+        nearest_dx, nearest_dy = nearest_on_ring(
+            lngs[k] - origin_x, lats[k] - origin_y, xs, ys, nxs, nys, ring_starts, ring_bboxes
+        )
+        distances[k] = distance_meters(
+            lats[k], lngs[k], origin_y + nearest_dy, origin_x + nearest_dx, high_precision
+        )
+    return distances
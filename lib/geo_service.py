@@ -1,81 +1,148 @@
-﻿import math
+import os
+from types import ModuleType
+from typing import Optional
 
+import numpy as np
+import shapely
 from shapely.geometry import Point
+from shapely.prepared import PreparedGeometry
 
-from lib.areas_repository import repository
-from lib.models import AnalysisRequest, AnalysisResponse, AreaResult
+from lib.areas_repository import RingArrays, private_cache_dir, repository
+from lib.models import (
+    AnalysisBatchRequest,
+    AnalysisBatchResponse,
+    AnalysisRequest,
+    AnalysisResponse,
+    AreaResult,
+)
 
-EARTH_RADIUS_M = 6_371_000
+# GEO_HIGH_PRECISION_DISTANCE=1 forca Haversine em todas as distancias.
+HIGH_PRECISION_DISTANCE = os.getenv("GEO_HIGH_PRECISION_DISTANCE", "").strip().lower() in {"1", "true", "yes"}
 
+_kernels: Optional[ModuleType] = None
 
-def _haversine(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
-    """Distancia Haversine entre dois pontos em metros."""
-    lat1, lng1, lat2, lng2 = map(math.radians, [lat1, lng1, lat2, lng2])
-    dlat = lat2 - lat1
-    dlng = lng2 - lng1
-    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng / 2) ** 2
-    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+def _get_kernels() -> ModuleType:
+    """
+    Importa os kernels Numba no primeiro uso (ou no warm-up do startup), nao no import
+    deste modulo: importar o numba e compilar os kernels custa segundos no cold start.
+    """
+    global _kernels
+    if _kernels is None:
+        # O numba le o cache de JIT com pickle: ele so vai para o diretorio privado do processo
+        # (o do pacote e somente-leitura na Vercel). Sem diretorio privado, compila sem cache.
+        # Precisa estar definido antes do import, quando o numba escolhe o local do cache.
+        cache_dir = private_cache_dir(create=True)
+        if cache_dir is not None:
+            os.environ.setdefault("NUMBA_CACHE_DIR", os.path.join(cache_dir, "numba"))
+        from lib import geo_kernels
+
+        _kernels = geo_kernels
+    return _kernels
 
 
 def _nearest_border_distance_meters(
     target_lat: float,
     target_lng: float,
-    geometry,
+    ring_xy: RingArrays,
 ) -> float:
     """
-    Encontra o ponto mais proximo na borda do poligono (via Shapely)
-    e calcula a distancia real com Haversine.
+    Encontra o ponto mais proximo na borda do poligono (segmentos em arrays NumPy)
+    e calcula a distancia real ate ele (equiretangular local ou Haversine).
+    O alvo e convertido uma vez para o referencial da area (deslocamento da origem).
     """
-    target_point = Point(target_lng, target_lat)
-    nearest_on_border = geometry.boundary.interpolate(
-        geometry.boundary.project(target_point)
+    kernels = _get_kernels()
+    nearest_dx, nearest_dy = kernels.nearest_on_ring(
+        target_lng - ring_xy.origin_x,
+        target_lat - ring_xy.origin_y,
+        ring_xy.xs,
+        ring_xy.ys,
+        ring_xy.next_xs,
+        ring_xy.next_ys,
+        ring_xy.ring_starts,
+        ring_xy.ring_bboxes,
     )
-    return _haversine(
-        target_lat,
-        target_lng,
-        nearest_on_border.y,
-        nearest_on_border.x,
+    nearest_lng = ring_xy.origin_x + nearest_dx
+    nearest_lat = ring_xy.origin_y + nearest_dy
+    return kernels.distance_meters(target_lat, target_lng, nearest_lat, nearest_lng, HIGH_PRECISION_DISTANCE)
+
+
+def warm_up_kernels() -> None:
+    """Compila (ou carrega do cache) os kernels no startup, fora do primeiro request."""
+    kernels = _get_kernels()
+    ring_starts = np.array([0, 2], dtype=np.int64)
+    for dtype in (np.float32, np.float64):
+        segment = np.array([0.0, 1.0], dtype=dtype)
+        ring_bboxes = np.array([[0.0, 0.0, 1.0, 1.0]], dtype=dtype)
+        kernels.nearest_on_ring(0.0, 0.0, segment, segment, segment[::-1].copy(), segment, ring_starts, ring_bboxes)
+        kernels.border_distances_batch(
+            np.zeros(1),
+            np.zeros(1),
+            0.0,
+            0.0,
+            segment,
+            segment,
+            segment[::-1].copy(),
+            segment,
+            ring_starts,
+            ring_bboxes,
+            HIGH_PRECISION_DISTANCE,
+        )
+    kernels.distance_meters(0.0, 0.0, 0.0, 1.0, HIGH_PRECISION_DISTANCE)
+
+
+def _resolve_areas(
+    request: AnalysisRequest | AnalysisBatchRequest,
+    lngs: np.ndarray,
+    lats: np.ndarray,
+    errors: list[str],
+) -> tuple[list[tuple[str, PreparedGeometry, Optional[RingArrays], dict]], dict[str, np.ndarray]]:
+    areas_to_analyze, unknown_slugs, candidates = repository.get_analysis_inputs(
+        request.areas or [],
+        request.agencias or [],
+        lngs,
+        lats,
+        with_ring_arrays=request.compute_distance,
     )
+    errors.extend(f"Area '{slug}' nao encontrada." for slug in unknown_slugs)
+
+    # Resultados saem da area mais relevante para a menos relevante (empate: slug).
+    areas_to_analyze.sort(key=lambda area: (-int(area[3].get("relevancia", 1)), area[0]))
+    return areas_to_analyze, candidates
 
 
 def analyze(request: AnalysisRequest) -> AnalysisResponse:
     target = Point(request.target.lng, request.target.lat)
     results: list[AreaResult] = []
     errors: list[str] = []
-    slugs_to_analyze: list[str] = []
-
-    if request.areas:
-        slugs_to_analyze.extend(request.areas)
-
-    if request.agencias:
-        slugs_to_analyze.extend(repository.find_slugs_by_agencias(request.agencias))
-
-    # Remove duplicados mantendo a ordem de chegada.
-    slugs_to_analyze = list(dict.fromkeys(slugs_to_analyze))
-
-    for slug in slugs_to_analyze:
-        geometry = repository.get_geometry(slug)
-
-        if geometry is None:
-            errors.append(f"Area '{slug}' nao encontrada.")
-            continue
+    # Areas fora do filtro do STRtree nao podem conter o ponto: vao direto para a distancia.
+    areas_to_analyze, candidates = _resolve_areas(
+        request,
+        np.array([request.target.lng]),
+        np.array([request.target.lat]),
+        errors,
+    )
 
-        area_data = repository.get_raw(slug) or {}
-        is_inside = geometry.contains(target) or geometry.touches(target)
+    for slug, prepared, ring_xy, area_data in areas_to_analyze:
+        # covers = contains + borda; a geometria preparada reaproveita o indice de arestas do GEOS.
+        is_inside = slug in candidates and prepared.covers(target)
 
         if is_inside:
             distance_m = 0.0
+        elif not request.compute_distance:
+            distance_m = None
         else:
             distance_m = round(
                 _nearest_border_distance_meters(
                     request.target.lat,
                     request.target.lng,
-                    geometry,
+                    ring_xy,
                 ),
                 2,
             )
 
-        results.append(AreaResult(
+        # Dados internos ja tipados: model_construct evita revalidar cada resultado.
+        results.append(AreaResult.model_construct(
             slug=slug,
             name=str(area_data.get("name", slug)),
             is_in=is_inside,
@@ -84,7 +151,72 @@ def analyze(request: AnalysisRequest) -> AnalysisResponse:
             relevancia=int(area_data.get("relevancia", 1)),
         ))
 
-    return AnalysisResponse(
+    return AnalysisResponse.model_construct(
+        results=results,
+        errors=errors if errors else None,
+    )
+
+
+def analyze_batch(request: AnalysisBatchRequest) -> AnalysisBatchResponse:
+    """
+    Mesma analise do `analyze`, mas para varios pontos: o filtro do STRtree, o teste
+    de pertencimento e a distancia ate a borda rodam vetorizados por area.
+    """
+    lngs = np.array([target.lng for target in request.targets], dtype=np.float64)
+    lats = np.array([target.lat for target in request.targets], dtype=np.float64)
+    results: list[list[AreaResult]] = [[] for _ in request.targets]
+    errors: list[str] = []
+    areas_to_analyze, candidates = _resolve_areas(request, lngs, lats, errors)
+
+    for slug, prepared, ring_xy, area_data in areas_to_analyze:
+        is_inside = np.zeros(len(request.targets), dtype=bool)
+        candidate_index = candidates.get(slug)
+        if candidate_index is not None:
+            # Para pontos, intersects equivale a covers (interior + borda).
+            is_inside[candidate_index] = shapely.intersects_xy(
+                prepared.context,
+                lngs[candidate_index],
+                lats[candidate_index],
+            )
+
+        distances = np.zeros(len(request.targets))
+        outside_index = np.flatnonzero(~is_inside)
+        if request.compute_distance and outside_index.size:
+            distances[outside_index] = _get_kernels().border_distances_batch(
+                lats[outside_index],
+                lngs[outside_index],
+                ring_xy.origin_x,
+                ring_xy.origin_y,
+                ring_xy.xs,
+                ring_xy.ys,
+                ring_xy.next_xs,
+                ring_xy.next_ys,
+                ring_xy.ring_starts,
+                ring_xy.ring_bboxes,
+                HIGH_PRECISION_DISTANCE,
+            )
+
+        name = str(area_data.get("name", slug))
+        agencia = str(area_data.get("agencia", ""))
+        relevancia = int(area_data.get("relevancia", 1))
+        for target_results, inside, distance in zip(results, is_inside.tolist(), distances.tolist()):
+            if inside:
+                distance_m = 0.0
+            elif not request.compute_distance:
+                distance_m = None
+            else:
+                distance_m = round(distance, 2)
+
+            target_results.append(AreaResult.model_construct(
+                slug=slug,
+                name=name,
+                is_in=inside,
+                nearest_border_distance_meters=distance_m,
+                agencia=agencia,
+                relevancia=relevancia,
+            ))
+
+    return AnalysisBatchResponse.model_construct(
         results=results,
         errors=errors if errors else None,
     )
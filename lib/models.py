@@ -2,20 +2,27 @@
 
 import re
 
+import numpy as np
 from pydantic import BaseModel, Field, field_validator, model_validator
 
 AreaMode = Literal["manual", "automatic"]
 AutomaticSourceType = Literal["kml_upload", "network_link"]
 HEX_COLOR_PATTERN = re.compile(r"^#[0-9a-fA-F]{6}$")
+SLUG_PATTERN = re.compile(r"^[a-z0-9_]+$")
+# Limite de pontos por analyze_batch: a resposta tem targets x areas resultados em memoria.
+MAX_BATCH_TARGETS = 1000
 
 
 class PointInput(BaseModel):
     lat: float = Field(..., description="Latitude do ponto alvo", ge=-90, le=90)
     lng: float = Field(..., description="Longitude do ponto alvo", ge=-180, le=180)
 
+    model_config = {"frozen": True}
+
+
+class AnalysisFilters(BaseModel):
+    """Filtros de areas e opcoes comuns ao analyze de um ponto e ao analyze em lote."""
 
-class AnalysisRequest(BaseModel):
-    target: PointInput
     areas: Optional[list[str]] = Field(
         default=None,
         description="Slugs das areas a analisar",
@@ -26,6 +33,10 @@ class AnalysisRequest(BaseModel):
         description="Nomes de agencias para buscar areas (case-insensitive)",
         min_length=1,
     )
+    compute_distance: bool = Field(
+        default=True,
+        description="Calcula a distancia ate a borda para areas fora do ponto (false retorna null)",
+    )
 
     @model_validator(mode="after")
     def validate_target_filters(self):
@@ -33,6 +44,10 @@ class AnalysisRequest(BaseModel):
             raise ValueError("Informe ao menos um filtro: areas ou agencias.")
         return self
 
+
+class AnalysisRequest(AnalysisFilters):
+    target: PointInput
+
     model_config = {
         "json_schema_extra": {
             "examples": [
@@ -46,35 +61,58 @@ class AnalysisRequest(BaseModel):
     }
 
 
+class AnalysisBatchRequest(AnalysisFilters):
+    targets: list[PointInput] = Field(
+        ...,
+        description=f"Pontos alvo analisados contra as mesmas areas (no maximo {MAX_BATCH_TARGETS})",
+        min_length=1,
+        max_length=MAX_BATCH_TARGETS,
+    )
+
+    model_config = {
+        "json_schema_extra": {
+            "examples": [
+                {
+                    "targets": [
+                        {"lat": -23.555, "lng": -46.630},
+                        {"lat": -23.548, "lng": -46.652},
+                    ],
+                    "areas": ["area_principal"],
+                    "agencias": ["SH Perdizes"],
+                }
+            ]
+        }
+    }
+
+
 class AreaResult(BaseModel):
     slug: str = Field(..., description="Slug da area")
     name: str = Field(..., description="Nome da area")
     is_in: bool = Field(..., description="Ponto esta dentro da area?")
-    nearest_border_distance_meters: float = Field(
+    nearest_border_distance_meters: Optional[float] = Field(
         ...,
-        description="Distancia em metros ate a borda mais proxima (0 se dentro)",
+        description="Distancia em metros ate a borda mais proxima (0 se dentro, null se compute_distance=false)",
     )
     agencia: str = Field(..., description="Nome da agencia da area")
     relevancia: int = Field(..., description="Nivel de relevancia da area (1 a 10)")
 
+    model_config = {"frozen": True, "extra": "forbid"}
+
 
 class AnalysisResponse(BaseModel):
-    results: list[AreaResult]
+    results: list[AreaResult] = Field(
+        ...,
+        description="Resultados ordenados por relevancia (maior primeiro) e depois por slug",
+    )
     errors: Optional[list[str]] = None
 
     model_config = {
+        "frozen": True,
+        "extra": "forbid",
         "json_schema_extra": {
             "examples": [
                 {
                     "results": [
-                        {
-                            "slug": "area_principal",
-                            "name": "Area Principal",
-                            "is_in": False,
-                            "nearest_border_distance_meters": 1028.43,
-                            "agencia": "SH Perdizes",
-                            "relevancia": 8,
-                        },
                         {
                             "slug": "area_completa",
                             "name": "Area Completa",
@@ -83,6 +121,14 @@ class AnalysisResponse(BaseModel):
                             "agencia": "SH Jardins",
                             "relevancia": 9,
                         },
+                        {
+                            "slug": "area_principal",
+                            "name": "Area Principal",
+                            "is_in": False,
+                            "nearest_border_distance_meters": 1028.43,
+                            "agencia": "SH Perdizes",
+                            "relevancia": 8,
+                        },
                     ],
                     "errors": None,
                 }
@@ -91,6 +137,29 @@ class AnalysisResponse(BaseModel):
     }
 
 
+class AnalysisBatchResponse(BaseModel):
+    results: list[list[AreaResult]] = Field(
+        ...,
+        description="Resultados por ponto, na mesma ordem de targets",
+    )
+    errors: Optional[list[str]] = None
+
+    model_config = {"frozen": True, "extra": "forbid"}
+
+
+def _validate_positions(ring: list[list[float]]) -> None:
+    for position in ring:
+        if len(position) < 2:
+            raise ValueError("Cada posicao deve conter ao menos [lng, lat].")
+
+        lng = position[0]
+        lat = position[1]
+        if not (-180 <= lng <= 180):
+            raise ValueError("Longitude fora do intervalo valido (-180 a 180).")
+        if not (-90 <= lat <= 90):
+            raise ValueError("Latitude fora do intervalo valido (-90 a 90).")
+
+
 class PolygonInput(BaseModel):
     """
     GeoJSON Polygon:
@@ -115,16 +184,25 @@ class PolygonInput(BaseModel):
             if len(ring) < 4:
                 raise ValueError("Cada anel do Polygon deve ter ao menos 4 posicoes.")
 
-            for position in ring:
-                if len(position) < 2:
-                    raise ValueError("Cada posicao deve conter ao menos [lng, lat].")
-
-                lng = position[0]
-                lat = position[1]
-                if not (-180 <= lng <= 180):
+            try:
+                positions = np.asarray(ring, dtype=np.float64)
+            except ValueError:
+                # Posicoes com tamanhos diferentes (ex.: algumas com altitude).
+                positions = None
+            if positions is None or positions.ndim != 2 or positions.shape[1] < 2:
+                _validate_positions(ring)
+                continue
+
+            # Checagem vetorizada por anel; a forma negada tambem rejeita NaN.
+            invalid_lng = ~((positions[:, 0] >= -180) & (positions[:, 0] <= 180))
+            invalid_lat = ~((positions[:, 1] >= -90) & (positions[:, 1] <= 90))
+            invalid = invalid_lng | invalid_lat
+            if invalid.any():
+                # Reporta o erro da primeira posicao invalida, como na validacao posicao a posicao.
+                first_invalid = int(invalid.argmax())
+                if invalid_lng[first_invalid]:
                     raise ValueError("Longitude fora do intervalo valido (-180 a 180).")
-                if not (-90 <= lat <= 90):
-                    raise ValueError("Latitude fora do intervalo valido (-90 a 90).")
+                raise ValueError("Latitude fora do intervalo valido (-90 a 90).")
 
         return coordinates
 
@@ -168,6 +246,12 @@ def _validate_hex_color(value: str) -> str:
     return normalized.lower()
 
 
+def _validate_slug(value: str) -> str:
+    if not SLUG_PATTERN.fullmatch(value):
+        raise ValueError("Slug invalido. Use apenas letras minusculas, numeros e _.")
+    return value
+
+
 class AreaInput(BaseModel):
     """
     Area geografica. Aceita multiplos polygons (ilhas separadas).
@@ -177,7 +261,7 @@ class AreaInput(BaseModel):
     slug: str = Field(
         ...,
         description="Identificador unico (ex: 'area_principal')",
-        pattern=r"^[a-z0-9_]+$",
+        json_schema_extra={"pattern": SLUG_PATTERN.pattern},
     )
     agencia: str = Field(..., description="Nome da agencia/unidade da imobiliaria (ex: SH Perdizes)")
     relevancia: int = Field(..., description="Nivel de relevancia da area (1 a 10)", ge=1, le=10)
@@ -197,6 +281,11 @@ class AreaInput(BaseModel):
             self.automatic_source = None
         return self
 
+    @field_validator("slug")
+    @classmethod
+    def validate_slug(cls, value: str) -> str:
+        return _validate_slug(value)
+
     @field_validator("color")
     @classmethod
     def validate_color(cls, value: str) -> str:
@@ -238,7 +327,7 @@ class AreaPatchInput(BaseModel):
     slug: Optional[str] = Field(
         default=None,
         description="Novo identificador unico",
-        pattern=r"^[a-z0-9_]+$",
+        json_schema_extra={"pattern": SLUG_PATTERN.pattern},
     )
     agencia: Optional[str] = Field(
         default=None,
@@ -267,16 +356,8 @@ class AreaPatchInput(BaseModel):
 
     @model_validator(mode="after")
     def validate_at_least_one_field(self):
-        if (
-            self.name is None
-            and self.slug is None
-            and self.agencia is None
-            and self.relevancia is None
-            and self.color is None
-            and self.polygons is None
-            and self.mode is None
-            and self.automatic_source is None
-        ):
+        # So olha os campos enviados; null explicito continua contando como "nao informado".
+        if all(getattr(self, field) is None for field in self.model_fields_set):
             raise ValueError(
                 "Informe ao menos um campo para atualizar: name, slug, agencia, relevancia, color, polygons, mode ou automatic_source."
             )
@@ -286,6 +367,13 @@ class AreaPatchInput(BaseModel):
             raise ValueError("Nao informe automatic_source quando o modo for manual.")
         return self
 
+    @field_validator("slug")
+    @classmethod
+    def validate_slug(cls, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return value
+        return _validate_slug(value)
+
     @field_validator("color")
     @classmethod
     def validate_color(cls, value: Optional[str]) -> Optional[str]:
@@ -307,3 +395,5 @@ class AreaSummary(BaseModel):
     last_refreshed_at: Optional[str] = None
     last_refresh_attempt_at: Optional[str] = None
     last_refresh_error: Optional[str] = None
+
+    model_config = {"frozen": True, "extra": "forbid"}